@@ -0,0 +1 @@
+"""Detección de fraudes: código compartido por las aplicaciones de Streamlit"""
@@ -0,0 +1,549 @@
+"""Carga del modelo, vectorización y predicción compartidas por las aplicaciones de detección de fraudes"""
+import os
+import streamlit as st
+import numpy as np
+import time
+import queue
+import threading
+import shutil
+import logging
+import functools
+import itertools
+import math
+import pickle
+import csv
+import io
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+# URL de Google Drive (reemplazar con tu ID)
+GDRIVE_FILE_ID = "1FuCvBzGOvN2q8AX_vEBc1vdbcuCj8j4i"
+
+# Copia local del modelo (FRAUDAPP_CACHE_DIR para cambiar el directorio)
+MODELO_CACHE_DIR = os.environ.get(
+    "FRAUDAPP_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "fraudapp")
+)
+MODELO_CACHE_PATH = os.path.join(MODELO_CACHE_DIR, f"modelo_{GDRIVE_FILE_ID}.joblib")
+
+# Modelos de sklearn que evalúan internamente en float32
+MODELOS_FLOAT32 = frozenset((
+    'DecisionTreeClassifier', 'RandomForestClassifier', 'ExtraTreesClassifier',
+    'GradientBoostingClassifier'
+))
+
+# FRAUDAPP_MODELO_LINEAL=0 evalúa los modelos lineales con sklearn
+USAR_MODELO_LINEAL = os.environ.get("FRAUDAPP_MODELO_LINEAL", "1") == "1"
+
+# lru_cache: también se usa desde el hilo de precarga
+@functools.lru_cache(maxsize=None)
+def obtener_pool():
+    """Pool de conexiones HTTP reutilizable con reintentos para la descarga del modelo"""
+    import urllib3
+
+    return urllib3.PoolManager(
+        maxsize=1,
+        timeout=urllib3.Timeout(connect=5, read=30),
+        # Reintentos acotados; las redirecciones de Drive tienen su propio contador
+        retries=urllib3.Retry(
+            total=8,
+            connect=3,
+            read=3,
+            status=3,
+            other=0,
+            redirect=5,
+            backoff_factor=0.2,
+            status_forcelist=(429, 500, 502, 503, 504),
+            raise_on_status=False
+        )
+    )
+
+def es_html(response):
+    """Indica si la respuesta de Drive es una página HTML en lugar del archivo"""
+    return response.headers.get('Content-Type', '').startswith('text/html')
+
+def descargar_modelo(destino):
+    """Descarga el modelo desde Google Drive y lo guarda en disco"""
+    download_url = f"https://drive.google.com/uc?id={GDRIVE_FILE_ID}&export=download"
+
+    response = obtener_pool().request('GET', download_url, preload_content=False)
+
+    # Aviso de antivirus de Drive para archivos grandes
+    if response.status == 200 and es_html(response):
+        response.drain_conn()
+        response = obtener_pool().request('GET', download_url + "&confirm=t", preload_content=False)
+
+    try:
+        # Una página HTML no es el modelo
+        if response.status != 200 or es_html(response):
+            return False
+
+        # Escribir a un archivo temporal
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        parcial = destino + ".part"
+        try:
+            with open(parcial, 'wb') as f:
+                shutil.copyfileobj(response, f, 8 << 20)
+        except Exception:
+            if os.path.exists(parcial):
+                os.remove(parcial)
+            raise
+    finally:
+        response.release_conn()
+
+    os.replace(parcial, destino)
+    return True
+
+def archivo_comprimido(ruta):
+    """Indica si el archivo de joblib está comprimido (un pickle sin comprimir empieza con 0x80)"""
+    with open(ruta, 'rb') as f:
+        return f.read(1) != b'\x80'
+
+def contar_arrays_mapeados(objeto):
+    """Cuenta los arrays mapeados desde el archivo en disco, recorriendo también los
+    sub-estimadores (p. ej. los `estimators_` de un ensamble)"""
+    if isinstance(objeto, np.memmap):
+        return 1
+    if isinstance(objeto, dict):
+        return sum(contar_arrays_mapeados(valor) for valor in objeto.values())
+    if isinstance(objeto, (list, tuple)):
+        return sum(contar_arrays_mapeados(valor) for valor in objeto)
+    if hasattr(objeto, 'get_params'):
+        return contar_arrays_mapeados(vars(objeto))
+    return 0
+
+def extraer_modelo_lineal(modelo):
+    """Extrae los pesos de un clasificador lineal binario para evaluarlo sin el wrapper de sklearn"""
+    coef = getattr(modelo, 'coef_', None)
+    intercept = getattr(modelo, 'intercept_', None)
+    clases = getattr(modelo, 'classes_', None)
+    if coef is None or intercept is None or clases is None:
+        return None
+    if len(clases) != 2 or np.ndim(coef) != 2 or coef.shape[0] != 1:
+        return None
+
+    # Solo la regresión logística entrega probabilidades desde la decisión
+    from sklearn.linear_model import LogisticRegression
+    logistica = isinstance(modelo, LogisticRegression)
+    if hasattr(modelo, 'predict_proba') and not logistica:
+        return None
+    # En multinomial la probabilidad es sigmoide(2s)
+    if logistica and getattr(modelo, 'multi_class', 'auto') == 'multinomial':
+        return None
+
+    return {
+        'coef': np.ascontiguousarray(coef[0], dtype=np.float64),
+        'intercept': float(np.ravel(intercept)[0]),
+        'clases': clases,
+        'logistica': logistica
+    }
+
+def tabla_encoder(encoder):
+    """Devuelve (tabla {valor: código}, código para valores desconocidos) de un encoder guardado
+
+    Acepta un LabelEncoder o un par (tabla {valor: float}, valor por defecto) exportado del
+    entrenamiento, por ejemplo de target encoding o WoE con su media global como valor por defecto.
+    """
+    if isinstance(encoder, tuple):
+        tabla, por_defecto = encoder
+        return {valor: float(codigo) for valor, codigo in tabla.items()}, float(por_defecto)
+    return dict(zip(encoder.classes_.tolist(), range(len(encoder.classes_)))), 0
+
+def _precargar_modelo():
+    """Hilo de fondo: descarga y deserializa el modelo mientras se pinta la página"""
+    try:
+        import joblib
+
+        try:
+            if not os.path.exists(MODELO_CACHE_PATH) and descargar_modelo(MODELO_CACHE_PATH):
+                logging.info("Modelo descargado en segundo plano")
+        finally:
+            _DESCARGA_LISTA.set()
+
+        if os.path.exists(MODELO_CACHE_PATH):
+            modelo_components = joblib.load(MODELO_CACHE_PATH, mmap_mode='r')
+            with _PRECARGA_LOCK:
+                if not _PRECARGA_TOMADA.is_set():
+                    _PRECARGADO.append(modelo_components)
+    except Exception as e:
+        logging.warning(f"No se pudo precargar el modelo: {str(e)}")
+    finally:
+        _DESCARGA_LISTA.set()
+        _PRECARGA_LISTA.set()
+
+# Estado de la precarga
+_DESCARGA_LISTA = threading.Event()
+_PRECARGA_LISTA = threading.Event()
+_PRECARGA_TOMADA = threading.Event()
+_PRECARGA_LOCK = threading.Lock()
+_PRECARGADO = []
+ESPERA_PRECARGA = 60  # segundos
+
+@st.cache_resource
+def iniciar_precarga():
+    """Inicia una sola vez por proceso el hilo de precarga del modelo"""
+    hilo = threading.Thread(target=_precargar_modelo, daemon=True)
+    hilo.start()
+    return hilo
+
+@st.cache_resource
+def cargar_modelo(columnas_categoricas=None):
+    """Carga el modelo desde la caché en disco o, si no existe, desde Google Drive
+
+    Solo se codifican las columnas de `columnas_categoricas` (todas las que tienen encoder si es None).
+    """
+    try:
+        # Esperar la precarga; si tarda, esperar solo la descarga
+        iniciar_precarga()
+        if not _PRECARGA_LISTA.wait(timeout=ESPERA_PRECARGA):
+            logging.warning("La precarga del modelo no terminó en %d s", ESPERA_PRECARGA)
+            if not _DESCARGA_LISTA.is_set():
+                st.info("📥 Descargando modelo...")
+                _DESCARGA_LISTA.wait()
+
+        import joblib
+
+        with _PRECARGA_LOCK:
+            _PRECARGA_TOMADA.set()
+            modelo_components = _PRECARGADO.pop() if _PRECARGADO else None
+        if modelo_components is None:
+            if not os.path.exists(MODELO_CACHE_PATH):
+                st.info("📥 Descargando modelo...")
+
+                if not descargar_modelo(MODELO_CACHE_PATH):
+                    st.error("❌ Error al descargar el modelo de Google Drive")
+                    return None
+
+            # Mapear los arrays en memoria
+            try:
+                modelo_components = joblib.load(MODELO_CACHE_PATH, mmap_mode='r')
+            except (EOFError, pickle.UnpicklingError):
+                # Borrar solo una caché corrupta
+                logging.warning("Caché del modelo ilegible, se elimina")
+                if os.path.exists(MODELO_CACHE_PATH):
+                    os.remove(MODELO_CACHE_PATH)
+                raise
+
+        logging.info(f"Modelo cargado con {contar_arrays_mapeados(modelo_components)} arrays mapeados en memoria")
+
+        # Reescribir sin compresión para poder mapear los arrays
+        if archivo_comprimido(MODELO_CACHE_PATH):
+            parcial = MODELO_CACHE_PATH + ".part"
+            joblib.dump(modelo_components, parcial, compress=0)
+            os.replace(parcial, MODELO_CACHE_PATH)
+            logging.info("Caché del modelo reescrita sin compresión")
+
+        # Posición de cada característica
+        modelo_components['feature_index'] = {
+            nombre: i for i, nombre in enumerate(modelo_components['selected_features'])
+        }
+
+        # Verificar la firma del modelo
+        n_features = len(modelo_components['selected_features'])
+        for nombre in ('scaler', 'modelo'):
+            esperadas = getattr(modelo_components[nombre], 'n_features_in_', n_features)
+            if esperadas != n_features:
+                raise ValueError(
+                    f"El {nombre} espera {esperadas} características y selected_features tiene {n_features}"
+                )
+
+        # Tablas de codificación
+        modelo_components['encoder_maps'] = {
+            columna: tabla_encoder(encoder)
+            for columna, encoder in modelo_components['encoders'].items()
+            if (columnas_categoricas is None or columna in columnas_categoricas)
+            and columna in modelo_components['feature_index']
+        }
+
+        # Avisar de las columnas categóricas descartadas
+        if columnas_categoricas is not None:
+            descartadas = [c for c in columnas_categoricas if c not in modelo_components['encoder_maps']]
+            if descartadas:
+                logging.warning(f"Columnas categóricas sin encoder o no usadas por el modelo: {descartadas}")
+
+        # Los encoders ya no se necesitan
+        modelo_components['columnas_encoders'] = list(modelo_components.pop('encoders'))
+
+        # Plan de llenado del vector
+        feature_index = modelo_components['feature_index']
+        encoder_maps = modelo_components['encoder_maps']
+        numericas = tuple(columna for columna in feature_index if columna not in encoder_maps)
+        indices_numericos = np.array([feature_index[columna] for columna in numericas], dtype=np.intp)
+        indices_numericos.flags.writeable = False
+        modelo_components['numeric_plan'] = (indices_numericos, numericas)
+        modelo_components['encoder_plan'] = tuple(
+            (feature_index[columna], columna, mapa, desconocido)
+            for columna, (mapa, desconocido) in encoder_maps.items()
+        )
+
+        # Transformación del scaler: (X - mean) * (1 / scale)
+        scaler = modelo_components['scaler']
+        modelo_components['scale_mean'] = (
+            np.array(scaler.mean_, dtype=np.float64) if scaler.with_mean
+            else np.zeros(n_features)
+        )
+        modelo_components['scale_inv'] = (
+            1.0 / np.asarray(scaler.scale_, dtype=np.float64) if scaler.with_std
+            else np.ones(n_features)
+        )
+
+        # Integrar el scaler en los pesos de los modelos lineales
+        from sklearn.linear_model import LogisticRegression, SGDClassifier
+        from sklearn.svm import LinearSVC
+        modelo = modelo_components['modelo']
+        modelo_components['escalado_en_pesos'] = isinstance(
+            modelo, (LogisticRegression, LinearSVC, SGDClassifier)
+        )
+        if modelo_components['escalado_en_pesos']:
+            coef = np.asarray(modelo.coef_, dtype=np.float64) * modelo_components['scale_inv']
+            modelo.intercept_ = np.asarray(modelo.intercept_, dtype=np.float64) - coef @ modelo_components['scale_mean']
+            modelo.coef_ = coef
+
+        # Los árboles de sklearn evalúan en float32
+        modelo_components['dtype'] = np.float32 if any(
+            clase.__name__ in MODELOS_FLOAT32 and clase.__module__.startswith('sklearn.')
+            for clase in type(modelo).__mro__
+        ) else np.float64
+
+        # Pesos del modelo lineal
+        lineal = extraer_modelo_lineal(modelo) if USAR_MODELO_LINEAL else None
+        modelo_components['modelo_lineal'] = lineal
+
+        # Clases del modelo y si entrega probabilidades
+        modelo_components['clases'] = modelo_components['modelo'].classes_
+        modelo_components['con_probabilidad'] = (
+            lineal['logistica'] if lineal is not None
+            else hasattr(modelo_components['modelo'], 'predict_proba')
+        )
+
+        # Inferencia en un solo hilo
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(1)
+
+        if hasattr(modelo_components['modelo'], 'n_jobs'):
+            modelo_components['modelo'].n_jobs = 1
+
+        # Predicción de calentamiento
+        try:
+            predecir(escalar(np.zeros((1, n_features), dtype=np.float64), modelo_components),
+                     modelo_components)
+        except Exception as e:
+            logging.warning(f"No se pudo calentar el modelo: {str(e)}")
+
+        st.success("✅ Modelo cargado exitosamente")
+        return modelo_components
+
+    except Exception as e:
+        st.error(f"❌ Error al cargar el modelo: {str(e)}")
+        return None
+
+def vectorizar(valores, modelo_components):
+    """Escribe los valores {característica: valor} en un vector en el orden del modelo, codificando categóricas"""
+    selected_features = modelo_components['selected_features']
+
+    X = np.empty((1, len(selected_features)), dtype=np.float64)
+    fila = X[0]
+
+    # Columnas numéricas
+    indices, columnas = modelo_components['numeric_plan']
+    fila[indices] = [float(valores.get(columna, 0)) for columna in columnas]
+
+    # Columnas categóricas
+    for indice, columna, mapa, desconocido in modelo_components['encoder_plan']:
+        valor = valores.get(columna, 0)
+        codigo = mapa.get(valor)
+        if codigo is None:
+            logging.warning("Valor desconocido '%s' en la columna %s", valor, columna)
+            st.warning(f"⚠️ Valor desconocido '{valor}' en la columna {columna}, se usa el código {desconocido}")
+            codigo = desconocido
+        fila[indice] = codigo
+
+    return X
+
+def vectorizar_lote(columnas, n_filas, modelo_components):
+    """Arma la matriz (n_filas, n_features) a partir de {característica: secuencia de valores}
+
+    Cada característica se escribe como una columna completa; las que falten quedan en 0.
+    """
+    X = np.zeros((n_filas, len(modelo_components['selected_features'])), dtype=np.float64)
+
+    # Columnas numéricas
+    indices, nombres = modelo_components['numeric_plan']
+    for indice, columna in zip(indices, nombres):
+        if columna in columnas:
+            X[:, indice] = np.asarray(columnas[columna], dtype=np.float64)
+
+    # Columnas categóricas; NaN marca los desconocidos
+    for indice, columna, mapa, desconocido in modelo_components['encoder_plan']:
+        if columna not in columnas:
+            continue
+        codigos = np.fromiter(map(mapa.get, columnas[columna], itertools.repeat(np.nan)),
+                              dtype=np.float64, count=n_filas)
+        faltantes = np.isnan(codigos)
+        desconocidos = int(np.count_nonzero(faltantes))
+        if desconocidos:
+            logging.warning("%d valores desconocidos en la columna %s", desconocidos, columna)
+            st.warning(f"⚠️ {desconocidos} valores desconocidos en la columna {columna}, se usa el código {desconocido}")
+            codigos[faltantes] = desconocido
+        X[:, indice] = codigos
+
+    return X
+
+def vector_como_dict(X, modelo_components):
+    """Devuelve la primera fila del vector como {característica: valor} para mostrarla en debug"""
+    return dict(zip(modelo_components['selected_features'], X[0].tolist()))
+
+def escalar(X, modelo_components):
+    """Escala el vector sobre sí mismo, sin la validación de scaler.transform"""
+    # Scaler integrado en los pesos
+    if modelo_components['escalado_en_pesos']:
+        return X
+    np.subtract(X, modelo_components['scale_mean'], out=X)
+    np.multiply(X, modelo_components['scale_inv'], out=X)
+    # Escalar en float64 y convertir al tipo del modelo
+    return X.astype(modelo_components['dtype'], copy=False)
+
+def predecir_lote(X_scaled, modelo_components):
+    """Evalúa el modelo sobre una matriz escalada y devuelve una lista de (predicción, probabilidad)"""
+    lineal = modelo_components['modelo_lineal']
+    if lineal is not None:
+        # Clasificador lineal
+        scores = X_scaled @ lineal['coef']
+        scores += lineal['intercept']
+        predicciones = lineal['clases'][(scores > 0).astype(int)]
+        if lineal['logistica']:
+            # Sigmoide vía tanh
+            probas = np.multiply(scores, 0.5)
+            np.tanh(probas, out=probas)
+            probas += 1.0
+            probas *= 0.5
+            return list(zip(predicciones, probas.tolist()))
+        return [(prediccion, None) for prediccion in predicciones]
+
+    # La clase se deriva de las probabilidades
+    modelo = modelo_components['modelo']
+    if modelo_components['con_probabilidad']:
+        probas = modelo.predict_proba(X_scaled)
+        predicciones = modelo_components['clases'][np.argmax(probas, axis=1)]
+        return list(zip(predicciones, probas[:, 1].tolist()))
+    return [(prediccion, None) for prediccion in modelo.predict(X_scaled)]
+
+def predecir(datos_scaled, modelo_components):
+    """Evalúa el modelo sobre el vector escalado y devuelve (predicción, probabilidad)"""
+    lineal = modelo_components['modelo_lineal']
+    if lineal is not None:
+        # Una sola fila de un modelo lineal
+        score = float(np.dot(datos_scaled[0], lineal['coef'])) + lineal['intercept']
+        prediccion = lineal['clases'][1] if score > 0 else lineal['clases'][0]
+        # Sigmoide vía tanh
+        probabilidad = 0.5 * (1.0 + math.tanh(0.5 * score)) if lineal['logistica'] else None
+        return prediccion, probabilidad
+    return predecir_lote(datos_scaled, modelo_components)[0]
+
+# Cola compartida entre sesiones
+_COLA_PREDICCIONES = queue.Queue()
+MAX_LOTE = 64
+ESPERA_LOTE = 0.002  # segundos
+TIMEOUT_LOTE = 0.05  # segundos
+
+def _procesar_lotes(modelo_components):
+    """Worker: toma las solicitudes pendientes y las evalúa juntas"""
+    # Matriz del lote reservada una sola vez
+    lote = np.empty((MAX_LOTE, len(modelo_components['selected_features'])),
+                    dtype=modelo_components['dtype'])
+
+    while True:
+        pendientes = [_COLA_PREDICCIONES.get()]
+        time.sleep(ESPERA_LOTE)
+        while len(pendientes) < MAX_LOTE:
+            try:
+                pendientes.append(_COLA_PREDICCIONES.get_nowait())
+            except queue.Empty:
+                break
+
+        try:
+            # Una sola solicitud se evalúa directamente
+            if len(pendientes) == 1:
+                resultados = [predecir(pendientes[0][0], modelo_components)]
+            else:
+                for i, (fila, _, _) in enumerate(pendientes):
+                    lote[i] = fila[0]
+                resultados = predecir_lote(lote[:len(pendientes)], modelo_components)
+        except Exception as e:
+            resultados = [e] * len(pendientes)
+
+        for (_, evento, slot), resultado in zip(pendientes, resultados):
+            slot.append(resultado)
+            evento.set()
+
+@st.cache_resource
+def iniciar_worker_predicciones(_modelo_components):
+    """Inicia una sola vez por proceso el hilo que agrupa las predicciones"""
+    hilo = threading.Thread(target=_procesar_lotes, args=(_modelo_components,), daemon=True)
+    hilo.start()
+    return hilo
+
+def predecir_agrupado(datos_scaled, modelo_components):
+    """Envía la fila al worker de lotes; si no responde a tiempo, predice directamente"""
+    evento = threading.Event()
+    slot = []
+    _COLA_PREDICCIONES.put((datos_scaled, evento, slot))
+
+    if evento.wait(timeout=TIMEOUT_LOTE):
+        resultado = slot[0]
+        if isinstance(resultado, Exception):
+            raise resultado
+        return resultado
+
+    return predecir(datos_scaled, modelo_components)
+
+@st.cache_data(ttl=3600, max_entries=1024, show_spinner=False)
+def evaluar_vector(X, _modelo_components):
+    """Escala y evalúa un vector preparado; los envíos repetidos se resuelven desde la caché"""
+    # Escalar datos sobre el mismo vector
+    datos_scaled = escalar(X, _modelo_components)
+
+    # Realizar predicción
+    return predecir_agrupado(datos_scaled, _modelo_components)
+
+@st.cache_data(ttl=3600, max_entries=16, show_spinner=False)
+def evaluar_csv(contenido, _modelo_components):
+    """Evalúa todas las filas de un CSV con una sola matriz y una sola llamada al modelo"""
+    lector = csv.reader(io.StringIO(contenido.decode('utf-8-sig')))
+    encabezado = next(lector, None)
+    if encabezado is None:
+        return {}
+
+    faltantes = [c for c in _modelo_components['selected_features'] if c not in encabezado]
+    if faltantes:
+        raise ValueError(f"Faltan columnas del modelo en el CSV: {faltantes}")
+
+    # Omitir filas vacías
+    filas, lineas = [], []
+    for fila in lector:
+        if not any(celda.strip() for celda in fila):
+            continue
+        if len(fila) != len(encabezado):
+            raise ValueError(
+                f"La línea {lector.line_num} tiene {len(fila)} campos y el encabezado {len(encabezado)}"
+            )
+        filas.append(fila)
+        lineas.append(lector.line_num)
+
+    columnas = {
+        nombre: [fila[i] for fila in filas]
+        for i, nombre in enumerate(encabezado) if nombre in _modelo_components['feature_index']
+    }
+    X = escalar(vectorizar_lote(columnas, len(filas), _modelo_components), _modelo_components)
+    predicciones, probabilidades = zip(*predecir_lote(X, _modelo_components)) if filas else ((), ())
+
+    resultado = {
+        'línea': lineas,
+        'predicción': ["⚠️ Fraude" if p == 1 else "✅ Segura" for p in predicciones]
+    }
+    if _modelo_components['con_probabilidad']:
+        resultado['probabilidad'] = list(probabilidades)
+    return resultado
@@ -0,0 +1,235 @@
+"""Página común de las aplicaciones de detección de fraudes: estilo, modo debug, formulario y resultados"""
+from fraudapp.inference import (
+    cargar_modelo,
+    iniciar_precarga,
+    iniciar_worker_predicciones,
+    evaluar_vector,
+    evaluar_csv
+)
+import streamlit as st
+from datetime import datetime
+import os
+import logging
+import functools
+import traceback
+
+# Categorías del formulario y su nombre para mostrar, calculados una sola vez
+CATEGORIAS = ("grocery_pos", "shopping_pos", "entertainment",
+              "food_dining", "health_fitness", "otros")
+NOMBRES_CATEGORIAS = {categoria: categoria.replace('_', ' ').title() for categoria in CATEGORIAS}
+
+# lru_cache devuelve siempre el mismo str; cache_data deserializaría una copia en cada rerun
+@functools.lru_cache(maxsize=None)
+def bloque_css():
+    """Lee una sola vez la hoja de estilos y la devuelve ya envuelta en <style>"""
+    with open(os.path.join(os.path.dirname(__file__), "styles.css"), encoding="utf-8") as f:
+        return f"<style>{f.read()}</style>"
+
+def configurar_pagina():
+    """Configura la página y aplica el estilo personalizado; debe ser el primer comando de Streamlit"""
+    st.set_page_config(
+        page_title="Detector de Fraudes",
+        page_icon="🔍",
+        layout="wide",
+        initial_sidebar_state="expanded"
+    )
+
+    # Se emite en cada rerun: Streamlit quita de la página los elementos que un rerun no vuelve a crear
+    st.markdown(bloque_css(), unsafe_allow_html=True)
+
+def selector_debug(activo_por_defecto=False):
+    """Muestra el interruptor de modo debug en la barra lateral"""
+    st.sidebar.checkbox("Modo debug", key='debug', value=activo_por_defecto)
+
+def modo_debug():
+    """Indica si el modo debug está activo en la barra lateral"""
+    return st.session_state.get('debug', False)
+
+def info_modelo(modelo_components):
+    """Devuelve la información del modelo para inspección manual"""
+    return {
+        "Características requeridas": modelo_components['selected_features'],
+        "Columnas con encoders": modelo_components['columnas_encoders'],
+        # Tabla por columnas: los arrays del scaler se envían tal cual, sin armar un dict por característica
+        "Información del Scaler": {
+            'característica': modelo_components['selected_features'],
+            'mean': modelo_components['scaler'].mean_,
+            'scale': modelo_components['scaler'].scale_
+        }
+    }
+
+def mostrar_info_modelo(modelo_components):
+    """Muestra la información del modelo en un expander de debug"""
+    with st.expander("🔍 Debug: Información del Modelo"):
+        for titulo, valor in info_modelo(modelo_components).items():
+            if isinstance(valor, dict):
+                st.write(f"{titulo}:")
+                st.dataframe(valor, hide_index=True)
+            else:
+                st.write(f"{titulo}:", valor)
+
+# Avisos del resultado; son fijos, así que se arman una sola vez al importar el módulo
+HTML_FRAUDE = """
+    <div class="fraud-warning">
+        <h3>⚠️ ALERTA: POSIBLE FRAUDE DETECTADO</h3>
+        <p>Esta transacción muestra patrones similares a transacciones fraudulentas.</p>
+        <p>Se recomienda una revisión manual detallada antes de proceder.</p>
+    </div>
+    """
+HTML_SEGURA = """
+    <div class="safe-transaction">
+        <h3>✅ TRANSACCIÓN SEGURA</h3>
+        <p>Esta transacción parece ser legítima según nuestro análisis.</p>
+        <p>Puede proceder con la operación normalmente.</p>
+    </div>
+    """
+
+def mostrar_resultado(prediccion, datos, probabilidad=None, detalles=None):
+    """Muestra el resultado de la predicción; `detalles` es el dict del expander (por defecto, los datos del formulario)"""
+    st.header("📊 Resultado del Análisis")
+
+    st.markdown(HTML_FRAUDE if prediccion == 1 else HTML_SEGURA, unsafe_allow_html=True)
+
+    st.markdown('<div class="metrics-container">', unsafe_allow_html=True)
+    col1, col2, col3 = st.columns(3)
+
+    with col1:
+        st.metric(
+            label="Monto de la Transacción",
+            value=f"${datos.amount:,.2f}"
+        )
+
+    with col2:
+        st.metric(
+            label="Categoría",
+            value=NOMBRES_CATEGORIAS.get(datos.category) or datos.category.replace('_', ' ').title()
+        )
+
+    with col3:
+        if probabilidad is not None:
+            st.metric(
+                label="Probabilidad de Fraude",
+                value=f"{probabilidad:.1%}"
+            )
+    st.markdown('</div>', unsafe_allow_html=True)
+
+    # Mostrar detalles adicionales
+    with st.expander("📝 Detalles de la Transacción"):
+        st.json(detalles if detalles is not None else datos._asdict())
+        st.write(f"🕒 Evaluación realizada el: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+
+def mostrar_lote_csv(modelo_components):
+    """Carga un CSV de transacciones y muestra la predicción de cada fila"""
+    archivo = st.file_uploader(
+        "Archivo CSV", type="csv",
+        help="Una columna por cada característica del modelo; las fechas como valores numéricos")
+    if archivo is None:
+        return
+
+    try:
+        resultado = evaluar_csv(archivo.getvalue(), modelo_components)
+    except Exception as e:
+        logging.error("Error al procesar el CSV: %s", e, exc_info=modo_debug())
+        st.error(f"❌ Error al procesar el CSV: {str(e)}")
+        return
+
+    if not resultado or not resultado['línea']:
+        st.warning("⚠️ El archivo no contiene transacciones")
+        return
+
+    st.dataframe(resultado, hide_index=True)
+    logging.info("Lote evaluado: %d transacciones", len(resultado['línea']))
+
+def run(crear_formulario, validar, preparar, columnas_categoricas=None,
+        detalles=None, debug_por_defecto=False):
+    """Página de evaluación común; cada app aporta su formulario, su validación y su preparación
+
+    `crear_formulario()` devuelve los datos del formulario, `validar(datos)` la lista de errores,
+    `preparar(datos, modelo_components)` el vector del modelo y `detalles(datos, prediccion,
+    probabilidad)`, si se indica, el resumen que se muestra junto al resultado.
+    """
+    # La descarga y carga del modelo avanzan en segundo plano mientras se pinta la página
+    iniciar_precarga()
+
+    st.title("🔍 Sistema de Detección de Fraudes")
+    st.write("Complete el formulario con los datos de la transacción para evaluar si es fraudulenta")
+
+    # Modo debug; ?debug=1 en la URL lo deja activado desde el inicio
+    selector_debug(debug_por_defecto or st.query_params.get('debug') == '1')
+
+    # Cargar el modelo una vez por sesión; los reruns de Streamlit lo toman de session_state
+    if st.session_state.get('modelo_components') is None:
+        st.session_state.modelo_components = cargar_modelo(columnas_categoricas)
+
+        # Worker compartido que agrupa las predicciones concurrentes
+        if st.session_state.modelo_components is not None:
+            iniciar_worker_predicciones(st.session_state.modelo_components)
+
+    modelo_components = st.session_state.modelo_components
+    if modelo_components is None:
+        # cache_resource también guarda el None de una carga fallida; limpiarlo para reintentar
+        cargar_modelo.clear()
+        return
+
+    # La información del modelo solo se muestra en modo debug
+    if modo_debug():
+        mostrar_info_modelo(modelo_components)
+
+    # El lote CSV se evalúa en su propia pestaña; el formulario sigue siendo la vista principal
+    tab_formulario, tab_lote = st.tabs(["📝 Transacción", "📄 Lote CSV"])
+    with tab_lote:
+        mostrar_lote_csv(modelo_components)
+
+    with tab_formulario:
+        evaluar_formulario(crear_formulario, validar, preparar, modelo_components, detalles)
+
+def evaluar_formulario(crear_formulario, validar, preparar, modelo_components, detalles=None):
+    """Muestra el formulario de una transacción, la valida y presenta su resultado"""
+    # Crear formulario
+    with st.form("transaction_form"):
+        datos = crear_formulario()
+
+        # Umbral de decisión ajustable, solo si el modelo entrega probabilidades
+        umbral = 0.5
+        if modelo_components['con_probabilidad']:
+            umbral = st.slider("Umbral de fraude", min_value=0.05, max_value=0.95,
+                               value=0.5, step=0.05)
+
+        submitted = st.form_submit_button("🔍 Evaluar Transacción")
+
+    if not submitted:
+        return
+
+    # Validar datos
+    errores = validar(datos)
+    if errores:
+        for error in errores:
+            st.error(f"❌ {error}")
+        return
+
+    try:
+        # Preparar datos y predecir
+        X = preparar(datos, modelo_components)
+        prediccion, probabilidad = evaluar_vector(X, modelo_components)
+
+        # La clase se deriva de la probabilidad ya calculada; con 0.5 se conserva la de predict
+        if probabilidad is not None and umbral != 0.5:
+            prediccion = modelo_components['clases'][int(probabilidad >= umbral)]
+
+        # Mostrar resultado
+        mostrar_resultado(prediccion, datos, probabilidad,
+                          detalles(datos, prediccion, probabilidad) if detalles else None)
+
+        # Logging; con argumentos el mensaje solo se formatea si el nivel INFO está activo
+        logging.info("Predicción realizada: %s para transacción de $%s", prediccion, datos.amount)
+
+    except Exception as e:
+        # El traceback va al log solo en modo debug; en la página ya se muestra igual condición
+        logging.error("Error al procesar la transacción: %s", e, exc_info=modo_debug())
+        st.error(f"❌ Error al procesar la transacción: {str(e)}")
+        with st.expander("🔍 Debug: Error Detallado"):
+            st.write("Tipo de error:", type(e).__name__)
+            st.write("Mensaje:", str(e))
+            # El traceback solo se formatea en modo debug
+            if modo_debug():
+                st.code(traceback.format_exc())